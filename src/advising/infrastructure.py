@@ -1,4 +1,9 @@
 import os
+import sys
+import io
+import contextlib
+import concurrent.futures
+import functools
 import openpyxl
 import pandas as pd
 import termcolor
@@ -8,10 +13,40 @@ import numbers
 from datetime import date
 
 
-module_catalogue_location = os.path.join(os.path.dirname(__file__),'Module_catalogue.xlsx') 
-module_catalogue = pd.read_excel(module_catalogue_location)
-
-def process_form_file_or_student_id(argument, programme_name = None):
+# the folder of this file does not change while we are running, so we only look it up once
+module_directory = os.path.dirname(os.path.abspath(__file__))
+# the student data should be at ../../student_data if running advising_tool.py
+tool_student_data_directory = os.path.join(module_directory, '../..', 'student_data')
+
+module_catalogue_location = os.path.join(module_directory,'Module_catalogue.xlsx') 
+# pandas' openpyxl reader already opens the catalogue read-only and without formulas or links
+module_catalogue = pd.read_excel(module_catalogue_location, engine = 'openpyxl')
+
+# For quick lookups, make a dictionary of catalogue entries keyed by module code.
+# Some modules are listed twice (e.g. when they run in both semesters), in that case
+# we use the first entry, as we did when filtering the data frame
+module_catalogue_dictionary = module_catalogue.drop_duplicates(subset='Module code').set_index('Module code', drop=False).to_dict(orient='index')
+module_catalogue_codes = frozenset(module_catalogue['Module code'])
+
+# the columns of the summary data frame, in the order of the entries returned by get_summary_data()
+summary_data_frame_columns = ['Student ID', 
+                              'Name',
+                              'Programme',
+                              'Hon. year',
+                              'Unmet programme requirements', 'Missing prerequisites', 'Modules not running', 'Timetable clashes', 'Adviser recommendations']
+
+# the number of programme years and expected honours years for all programmes that contain 
+# one of these degree names
+programme_years_by_degree_name = {'Bachelor of Science': (4, 2),
+                                  'Master in Mathematics': (5, 3),
+                                  'Master of Arts (Honours)': (4, 2)}
+
+# the number of programme years and expected honours years for programmes that we only
+# recognise by their full name
+programme_years_by_programme_name = {'Master in Chemistry (Honours) Chemistry with Mathematics': (5, 3),
+                                     'Master in Physics (Honours) Mathematics and Theoretical Physics': (5, 3)}
+
+def process_form_file_or_student_id(argument, programme_name = None, check_data_consistency = False):
     """preforms all advising checks on the 
     submitted form.
     
@@ -25,12 +60,50 @@ def process_form_file_or_student_id(argument, programme_name = None):
         
     programme_name : string
         if this is not none than the programme requirements for this programme will be checked.
+
+    check_data_consistency : bool
+        if True, check that all entries of the student in the data bases have the same programme, name and email.
+        
+    Returns:
+    --------
+    
+    summary_data_frame : pandas data frame
+        a data frame with one row containing the results of all checks
+    """ 
+    summary_data = get_summary_data(argument, programme_name, check_data_consistency)
+    summary_data_frame = generate_summary_data_frame_from_entries(summary_data)
+    
+    return summary_data_frame
+
+def get_summary_data(argument, programme_name = None, check_data_consistency = False):
+    """preforms all advising checks on the submitted form and returns the results
+    as a list, so that results for many students can be collected before making a data frame.
+    
+    Parameters:
+    -----------
+    
+    argument : string or int
+        if it's a string: path to the file that is being investigated,
+        i.e. a filled-in module choice form
+        if it's an integer: a valid student ID
+        
+    programme_name : string
+        if this is not none than the programme requirements for this programme will be checked.
+
+    check_data_consistency : bool
+        if True, check that all entries of the student in the data bases have the same programme, name and email.
+        
+    Returns:
+    --------
+    
+    summary_data : list
+        the results of all checks, with entries in the order of summary_data_frame_columns
     """ 
     if isinstance(argument, str):
-        student_or_warning = parse_excel_form(argument)
+        student_or_warning = parse_excel_form(argument, check_data_consistency)
         _,filename_for_output = os.path.split(argument)
     elif isinstance(argument, numbers.Integral):
-        student_or_warning = collect_student_data(argument)
+        student_or_warning = collect_student_data(argument, check_data_consistency = check_data_consistency)
         filename_for_output = 'student id ' + str(argument)
     else:
         raise(ValueError('Could not read argument of process_form_file_or_student, it is not an int or a string'))
@@ -49,9 +122,7 @@ def process_form_file_or_student_id(argument, programme_name = None):
                     0,
                     warning_message, ' ', ' ', ' ', ' ']
 
-        summary_data_frame = generate_summary_data_frame_from_entries(summary_data)
-
-        return summary_data_frame
+        return summary_data
     
     student = student_or_warning
     if programme_name is not None:
@@ -95,11 +166,9 @@ def process_form_file_or_student_id(argument, programme_name = None):
                     student.current_honours_year,
                     missed_programme_requirements, missed_prerequisites, not_running_modules, timetable_clashes, adviser_recommendations]
 
-    summary_data_frame = generate_summary_data_frame_from_entries(summary_data)
-    
-    return summary_data_frame
+    return summary_data
 
-def parse_excel_form(filename):
+def parse_excel_form(filename, check_data_consistency = False):
     """returns an instance of a 'student' class
     that has all the excel data as named attributes
 
@@ -109,6 +178,9 @@ def parse_excel_form(filename):
     filename : string
         path to the file that is being investigated,
         i.e. a filled-in module choice form
+
+    check_data_consistency : bool
+        if True, check that all entries of the student in the data bases have the same programme, name and email.
         
     Returns:
     --------
@@ -118,13 +190,23 @@ def parse_excel_form(filename):
         message about what went wrong
     """
     # open the form file and read in the student ID
-    this_workbook = openpyxl.load_workbook(filename=filename)
+    # we only read values from the form, so we don't need openpyxl's full cell model
+    this_workbook = openpyxl.load_workbook(filename=filename, read_only=True, data_only=True)
     sheet = this_workbook.active
-    student_id = sheet["D5"].value
+    # read columns B to D in a single pass: the student ID is in D5 and the 
+    # headers and module codes are in column B
+    form_rows = list(sheet.iter_rows(min_col=2, max_col=4, values_only=True))
+    # read-only workbooks keep the file open until they are closed
+    this_workbook.close()
+    column_b_entries = [row[0] for row in form_rows]
+    if len(form_rows) >= 5:
+        student_id = form_rows[4][2]
+    else:
+        student_id = None
     if not isinstance(student_id, int):
         return 'No student ID'
         
-    this_student = collect_student_data(student_id, include_credits=False)
+    this_student = collect_student_data(student_id, include_credits=False, check_data_consistency=check_data_consistency)
     if isinstance(this_student, str):
         return this_student
    
@@ -143,7 +225,7 @@ def parse_excel_form(filename):
         calendar_year = this_student.current_calendar_year + remaining_honours_year - this_student.current_honours_year
         calendar_year_string = str(calendar_year) + '/' + str(calendar_year + 1)
         for semester_number in [1,2]:
-            semester_modules = get_modules_under_header(sheet, year_key + ' of Honours: Semester ' + str(semester_number)) 
+            semester_modules = get_modules_under_header(sheet, year_key + ' of Honours: Semester ' + str(semester_number), column_b_entries) 
             for module in semester_modules:
                 module_table.append([year_key, calendar_year_string, 'S' + str(semester_number), module,])
 
@@ -155,7 +237,7 @@ def parse_excel_form(filename):
     # return the student
     return this_student
 
-def collect_student_data(student_id, include_credits = True):
+def collect_student_data(student_id, include_credits = True, check_data_consistency = False):
     """Collects all available data for the student with the given ID
     
     Parameters :
@@ -163,6 +245,9 @@ def collect_student_data(student_id, include_credits = True):
     
     student_id : int
         the student id
+
+    check_data_consistency : bool
+        if True, check that all entries of the student in the data bases have the same programme, name and email.
         
     Returns :
     ---------
@@ -174,20 +259,10 @@ def collect_student_data(student_id, include_credits = True):
     # process data base here
     
     # Now that we have the student ID we can look up the student in the database:
-    data_bases = get_all_mms_data_bases()
-
     # get a table with only the entries for this student
-    student_not_yet_found = True
-
-    data_base_index = 0
-    while student_not_yet_found and data_base_index < len(data_bases):
-        this_data_base = data_bases[data_base_index]
-        if student_id in this_data_base['Student ID'].to_numpy():
-            student_not_yet_found = False
-            student_data_base = this_data_base[this_data_base['Student ID'] == student_id]
-        data_base_index += 1
+    student_data_base = get_student_data_base(student_id)
         
-    if student_not_yet_found:
+    if student_data_base is None:
         return 'contains invalid student ID ' + str(student_id)
 
     # infer the year of study from the earliest module taken
@@ -253,43 +328,33 @@ def collect_student_data(student_id, include_credits = True):
     s_coded_modules = data_base_of_s_coded_modules['Module code'].to_list()
 
     #identify the programme of the student
-    programme_entries = student_data_base['Programme name'].unique()    
-    assert(len(programme_entries) == 1)
-    programme_name = programme_entries[0]
+    # all entries of a student have the same programme, name and email, so we read them from the first entry
+    if check_data_consistency:
+        for column_name in ['Programme name', 'Given names', 'Family name', 'Email']:
+            if student_data_base[column_name].nunique(dropna=False) != 1:
+                raise(ValueError('the data bases have different entries in column ' + column_name + 
+                                 ' for student ' + str(student_id)))
+
+    programme_name = student_data_base['Programme name'].iat[0]
     
-    given_name_entries = student_data_base['Given names'].unique()
-    assert(len(given_name_entries) == 1)
-    given_name = given_name_entries[0]
+    given_name = student_data_base['Given names'].iat[0]
     
-    family_name_entries = student_data_base['Family name'].unique()
-    assert(len(family_name_entries) == 1)
-    family_name = family_name_entries[0]
+    family_name = student_data_base['Family name'].iat[0]
     
     full_name = given_name + ' ' + family_name
 
-    email_entries = student_data_base['Email'].unique()
-    assert(len(email_entries) == 1)
-    email = email_entries[0]
+    email = student_data_base['Email'].iat[0]
 
     # Figure out what year they are in and how many they have left
-    if 'Bachelor of Science' in programme_name:
-        no_of_programme_years = 4
-        expected_honours_years = 2
-    elif 'Master in Mathematics' in programme_name:
-        no_of_programme_years = 5
-        expected_honours_years = 3
-    elif 'Master of Arts (Honours)' in programme_name: 
-        no_of_programme_years = 4
-        expected_honours_years = 2
-    elif 'Master in Chemistry (Honours) Chemistry with Mathematics' == programme_name:
-        no_of_programme_years = 5
-        expected_honours_years = 3
-    elif 'Master in Physics (Honours) Mathematics and Theoretical Physics' == programme_name:
-        no_of_programme_years = 5
-        expected_honours_years = 3
+    if programme_name in programme_years_by_programme_name:
+        no_of_programme_years, expected_honours_years = programme_years_by_programme_name[programme_name]
     else:
-        warning_message = 'Do not recognise student programme for parsing: ' + programme_name
-        return warning_message
+        programme_years = next((years for degree_name, years in programme_years_by_degree_name.items() 
+                                if degree_name in programme_name), None)
+        if programme_years is None:
+            warning_message = 'Do not recognise student programme for parsing: ' + programme_name
+            return warning_message
+        no_of_programme_years, expected_honours_years = programme_years
     
     if 'EXA120' in student_data_base['Module code'].values:
         no_of_programme_years -=1
@@ -298,13 +363,14 @@ def collect_student_data(student_id, include_credits = True):
     current_honours_year = year_of_study - no_subhonours_years
     
     # make a separate data base of passed honours modules
+    # group the passed modules by academic year once, we look them up for each honours year below
+    passed_modules_by_year = data_base_of_passed_modules.groupby('Year', sort=False)['Module code'].agg(list).to_dict()
     passed_honours_modules = list()
     for previous_honours_year in range(1,current_honours_year+1):
         year_difference = current_honours_year - previous_honours_year  
         year_number = current_calendar_year-year_difference
         calendar_year_string = str(year_number) + '/' + str(year_number + 1)
-        data_base_of_passed_modules_this_year = data_base_of_passed_modules[data_base_of_passed_modules['Year']==calendar_year_string]
-        passed_modules_this_year = data_base_of_passed_modules_this_year['Module code'].to_list()
+        passed_modules_this_year = passed_modules_by_year.get(calendar_year_string, [])
         passed_honours_modules += passed_modules_this_year
         
     # updating first honours year if we know when the student has taken the first MT3* module 
@@ -324,9 +390,8 @@ def collect_student_data(student_id, include_credits = True):
         passed_honours_modules = list()
         for previous_year in range(first_honours_year,current_calendar_year+1):
             calendar_year_string = str(previous_year) + '/' + str(previous_year + 1)
-            data_base_of_passed_modules_this_year = data_base_of_passed_modules[data_base_of_passed_modules['Year']==calendar_year_string]
-            passed_modules_this_hear = data_base_of_passed_modules_this_year['Module code'].to_list()
-            passed_honours_modules += passed_modules_this_hear
+            passed_modules_this_year = passed_modules_by_year.get(calendar_year_string, [])
+            passed_honours_modules += passed_modules_this_year
 
     passed_module_table = reduce_official_data_base(data_base_of_passed_modules, current_honours_year, current_calendar_year) 
     
@@ -358,6 +423,8 @@ def collect_student_data(student_id, include_credits = True):
  
 def get_all_mms_data_bases():
     '''looks into the student_data folder and loads all data bases in there that it can find into memory.
+    The files are only read again if they have changed since the last call, so the data frames are
+    shared between calls and should not be modified.
     
     Returns :
     ---------
@@ -365,17 +432,55 @@ def get_all_mms_data_bases():
     data_bases: list of pandas data frames
         each entry of the list is one pandas data frame from a .csv file found in the student_data folder.
     '''
-    # Now that we have the student ID we can look up the student in the database:
-    current_file_directory = os.path.dirname(os.path.abspath(__file__))
+    data_paths, modification_times = find_mms_data_files()
+    data_bases = list(load_mms_data_bases(data_paths, modification_times))
+
+    return data_bases
+
+def get_student_data_base(student_id):
+    '''looks up all data base entries for one student. If the student appears in more than one 
+    data base file, the entries from the first file are used.
+    
+    Parameters :
+    ------------
+    
+    student_id : int
+        the student id
+    
+    Returns :
+    ---------
+    
+    student_data_base : pandas data frame or None
+        the data base entries of the student, None if the student is not in any of the data bases
+    '''
+    data_paths, modification_times = find_mms_data_files()
+    indexed_data_base = index_mms_data_bases(data_paths, modification_times)
+    if student_id in indexed_data_base.index:
+        student_data_base = indexed_data_base.loc[[student_id]]
+    else:
+        student_data_base = None
+    
+    return student_data_base
 
+def find_mms_data_files():
+    '''finds the student_data folder and the data base files in it.
+    
+    Returns :
+    ---------
+    
+    data_paths : tuple of strings
+        paths to the .csv files in the student_data folder
+        
+    modification_times : tuple of floats
+        modification times of these files, we use these to tell when cached data bases are out of date
+    '''
     # Find the data directory; this should be at ../../student_data (if running advising_tool.py)
     # or at the CWD[/student_data] if using as a library
-    path_if_tool = os.path.join(current_file_directory, '../..', 'student_data')
     path_if_cwd = os.path.join(os.getcwd(), "student_data")
 
-    if os.path.exists(path_if_tool):
-        data_directory = path_if_tool
-    elif os.path.exists(os.path.join(os.getcwd(), "student_data")):
+    if os.path.exists(tool_student_data_directory):
+        data_directory = tool_student_data_directory
+    elif os.path.exists(path_if_cwd):
         data_directory = path_if_cwd
     else:
         data_directory = os.getcwd()
@@ -388,16 +493,87 @@ def get_all_mms_data_bases():
     if len(data_files) == 0:
         raise FileNotFoundError("missing student data .csv file")
     
+    data_paths = tuple(os.path.join(data_directory, data_file_name) for data_file_name in data_files)
+    # the modification times are part of the cache key, so that changed files are read in again
+    modification_times = tuple(os.path.getmtime(data_path) for data_path in data_paths)
+
+    return data_paths, modification_times
+
+@functools.lru_cache(maxsize=1)
+def index_mms_data_bases(data_paths, modification_times):
+    '''merges the given data base files into one data frame with the student ID as the index, 
+    so that students can be looked up without searching through every file. Use 
+    get_student_data_base() instead of calling this function directly.
+    
+    Parameters :
+    ------------
+    
+    data_paths : tuple of strings
+        paths to the .csv files in the student_data folder
+        
+    modification_times : tuple of floats
+        modification times of these files, only used to tell when the cache is out of date
+    
+    Returns :
+    ---------
+    
+    indexed_data_base : pandas data frame
+        the entries of all data bases, indexed by student ID
+    '''
+    data_bases = load_mms_data_bases(data_paths, modification_times)
+    
+    # only keep each student's entries from the first data base that they appear in
+    seen_student_ids = set()
+    list_of_new_entries = []
+    for this_data_base in data_bases:
+        new_entries = this_data_base[~this_data_base['Student ID'].isin(seen_student_ids)]
+        if not new_entries.empty:
+            list_of_new_entries.append(new_entries)
+        seen_student_ids.update(this_data_base['Student ID'])
+    if len(list_of_new_entries) == 0:
+        # none of the data bases have any entries, so we keep the empty first one to get the columns
+        list_of_new_entries.append(data_bases[0])
+    indexed_data_base = pd.concat(list_of_new_entries)
+
+    # the stable sort keeps the entries of each student in the order of the file, 
+    # and lets pandas find a student's entries with a binary search
+    indexed_data_base = indexed_data_base.set_index('Student ID', drop=False).rename_axis(None)
+    indexed_data_base = indexed_data_base.sort_index(kind='mergesort')
+
+    return indexed_data_base
+
+@functools.lru_cache(maxsize=1)
+def load_mms_data_bases(data_paths, modification_times):
+    '''reads in the given data base files. Advising a whole folder of forms needs the same files 
+    for every student, so the result is cached. Use get_all_mms_data_bases() instead of calling 
+    this function directly.
+    
+    Parameters :
+    ------------
+    
+    data_paths : tuple of strings
+        paths to the .csv files in the student_data folder
+        
+    modification_times : tuple of floats
+        modification times of these files, only used to tell when the cache is out of date
+    
+    Returns :
+    ---------
+    
+    data_bases: tuple of pandas data frames
+        one pandas data frame per .csv file
+    '''
     # turn them all into data base files
     data_bases = []
-    for data_file_name in data_files:
-        data_path = os.path.join(data_directory, data_file_name)
+    for data_path in data_paths:
         this_data_frame = pd.read_csv(data_path)
-        this_data_frame = this_data_frame.map(strip_excel_formatting)
+        # strip excel formatting, skipping the columns that pandas has read as numbers
+        for column_name in this_data_frame.columns:
+            this_data_frame[column_name] = strip_excel_formatting_from_column(this_data_frame[column_name])
         data_bases.append(this_data_frame.astype({"Student ID": "int64",
                                                   "Credits": "float64"}))
 
-    return data_bases
+    return tuple(data_bases)
 
 # Some data files come with data in the form `="..."`; strip this if it exists
 def strip_excel_formatting(cell_data):
@@ -406,6 +582,13 @@ def strip_excel_formatting(cell_data):
             return cell_data[2:-1]
     return cell_data
 
+# The same as strip_excel_formatting(), for a whole data frame column at once
+def strip_excel_formatting_from_column(column):
+    if not (pd.api.types.is_object_dtype(column) or pd.api.types.is_string_dtype(column)):
+        # numbers can't have excel formatting, so we don't need to look at every entry
+        return column
+    return column.map(strip_excel_formatting, na_action='ignore')
+
 
 def reduce_official_data_base(data_frame, current_honours_year, current_calendar_year, include_credits = True):
     '''take a table from the official data base and reduce it to a smaller pandas data frame that only has entries that
@@ -478,7 +661,7 @@ def generate_summary_data_frame_from_entries(data_list):
     -----------
 
     data_list : list
-        list entries vary in type, see the expected order of entries in the code below.
+        list entries vary in type, see summary_data_frame_columns for the expected order of entries.
         
     Returns :
     ---------
@@ -486,11 +669,26 @@ def generate_summary_data_frame_from_entries(data_list):
     summary_data_frame : pandas data frame
         the pandas data frame containing the list data and the correct headers.
     """
-    summary_data_frame = pd.DataFrame([data_list], columns = ['Student ID', 
-                                                                 'Name',
-                                                                 'Programme',
-                                                                 'Hon. year',
-                                                                 'Unmet programme requirements', 'Missing prerequisites', 'Modules not running', 'Timetable clashes', 'Adviser recommendations'])
+    summary_data_frame = generate_summary_data_frame_from_list_of_entries([data_list])
+    
+    return summary_data_frame
+
+def generate_summary_data_frame_from_list_of_entries(list_of_data_lists):
+    """Generates the summary data frame from the entries for many students at once.
+    
+    Parameters:
+    -----------
+
+    list_of_data_lists : list of lists
+        one list per student, as returned by get_summary_data()
+        
+    Returns :
+    ---------
+    
+    summary_data_frame : pandas data frame
+        the pandas data frame with one row per student and the correct headers.
+    """
+    summary_data_frame = pd.DataFrame(list_of_data_lists, columns = summary_data_frame_columns)
     
     return summary_data_frame
    
@@ -519,8 +717,8 @@ def colour_code_print_statement(print_statement, is_advice = False):
     print(' ')
 
 def merge_list_to_long_string(a_list):
-    """takes a list of strings and returns a string that separates the entries with a comma and a space.
-        Returns the string 'None' if the list is empty. If the first entry of the list is 'None' then that entry will be ignored.
+    """takes a list of strings and returns a string that puts each entry on a new line.
+        Returns the string 'None' if the list is empty. Entries of the list that are 'None' will be ignored.
     
     Parameters:
     -----------
@@ -530,25 +728,17 @@ def merge_list_to_long_string(a_list):
     Returns:
     --------
     a_string : string
-        contains all entries in a_list separated by a comma and a space
-        is 'None' if a_list is empty
+        contains all entries in a_list separated by line breaks
+        is 'None' if a_list is empty or only contains 'None'
     """
-    a_string = ''
-    first_item_found = False
-    for item in a_list:
-        if item != 'None':
-            if first_item_found:
-                a_string += '\n' + item
-            else:
-                a_string = item
-                first_item_found = True
+    a_string = '\n'.join(item for item in a_list if item != 'None')
     
     if a_string == '':
         a_string = 'None'
     
     return a_string
  
-def get_modules_under_header(sheet, header):
+def get_modules_under_header(sheet, header, column_b_entries = None):
     """get all the modules in the student module choice form under a given heading
     
     Parameters:
@@ -559,6 +749,10 @@ def get_modules_under_header(sheet, header):
         
     header : string
         the header that we are investigating
+        
+    column_b_entries : list
+        the values in column B of the sheet, one per row. If this is given the sheet is not read again,
+        which saves going through the whole sheet for every header.
 
     Returns:
     --------
@@ -567,21 +761,21 @@ def get_modules_under_header(sheet, header):
         module codes under the given header
     """
     modules = []
-    for row in sheet.iter_rows():
-        if isinstance(row[1].value, str):
-            if header in row[1].value:
-                row_number = row[1].row
-
-    # the row number where modules are entered is 2 down
-    row_number += 2
-    next_cell_name_with_module = 'B' + str(row_number)
-    module_code_is_not_empty = sheet[next_cell_name_with_module].value is not None
-
-    row_index = 0
-    while row_index < 6:
-        this_cell_is_empty = sheet[next_cell_name_with_module].value is None
-        if not this_cell_is_empty:
-            module_code_entry = sheet[next_cell_name_with_module].value
+    # read column B in a single pass, the sheet may be read-only, where looking up
+    # individual cells is slow
+    if column_b_entries is None:
+        column_b_entries = [row[0] for row in sheet.iter_rows(min_col=2, max_col=2, values_only=True)]
+    header_index = None
+    for entry_index, entry in enumerate(column_b_entries):
+        if isinstance(entry, str):
+            if header in entry:
+                header_index = entry_index
+    if header_index is None:
+        raise(ValueError('could not find the header ' + header + ' in the module choice form'))
+
+    # modules are entered in the six rows starting 2 down from the header
+    for module_code_entry in column_b_entries[header_index + 2:header_index + 8]:
+        if module_code_entry is not None:
             if isinstance(module_code_entry, int):
                 module_code = str(module_code_entry)
                 module_code = 'MT' + module_code
@@ -590,10 +784,6 @@ def get_modules_under_header(sheet, header):
             module_code = module_code.strip()
             module_code = module_code.replace('Mt','MT')
             modules.append(module_code)
-        row_number+=1 
-        next_cell_name_with_module = 'B' + str(row_number)
-        # module_code_is_not_empty = sheet[next_cell_name_with_module].value is not None
-        row_index += 1
 
     return modules
 
@@ -724,22 +914,27 @@ def save_summary_data_frame(data_frame, filename):
         run.add_break()
         run.add_break()
         
-        word_document.save(word_file_name)
+    # save the document once all students are in it
+    word_document.save(word_file_name)
  
     text_columns = ['Unmet programme requirements', 'Missing prerequisites', 'Modules not running', 'Timetable clashes', 'Adviser recommendations']
     data_frame[text_columns] = data_frame[text_columns].replace('\n', '; ', regex=True)
+    # set the font size of all cells while writing the file, and make the first row bold 
+    font_size_css = 'font-size: 14pt;'
     styled_data_frame = (data_frame.style.apply(colour_code_passes, subset = ['Unmet programme requirements', 'Missing prerequisites', 'Modules not running',
                                                                                        'Timetable clashes'], axis = 0).
-                          apply(colour_recommendations, subset = ['Adviser recommendations'], axis = 0))
+                          apply(colour_recommendations, subset = ['Adviser recommendations'], axis = 0).
+                          set_properties(**{'font-size': '14pt'}).
+                          map_index(lambda _: font_size_css + ' font-weight: bold;', axis = 'columns').
+                          map_index(lambda _: font_size_css + ' font-weight: normal;', axis = 'index'))
 
 
     ## write to excel
 
-    writer = pd.ExcelWriter(filename) 
-    # Manually adjust the width of each column
+    writer = pd.ExcelWriter(filename, engine = 'xlsxwriter') 
     styled_data_frame.to_excel(writer)
     worksheet = writer.sheets['Sheet1']
-    font = openpyxl.styles.Font(size=14)
+    # Manually adjust the width of each column
     worksheet.set_column(0,0,width=5)
     worksheet.set_column(1,1,width=12)
     worksheet.set_column(2,2,width=22)
@@ -751,31 +946,10 @@ def save_summary_data_frame(data_frame, filename):
     worksheet.set_column(8,8,width=40)
     worksheet.set_column(9,9,width=40)
     
-    # The only way I found to change the font size is to save the excel file, reload it, and then edit the fontsize, and save it again
     writer.close()
     
-    # reload
-    reloaded_workbook = openpyxl.load_workbook(filename)
-
-    # Access the active sheet
-    worksheet = reloaded_workbook.active
-
-    # Set the font size for all cells in the worksheet
-    font_size = 14
-    font = openpyxl.styles.Font(size=font_size)
-    for row in worksheet.iter_rows():
-        for cell in row:
-            cell.font = font
-
-    # Make the first row bold
-    bold_font = openpyxl.styles.Font(size=font_size, bold=True)
-    for cell in worksheet[1]:
-        cell.font = bold_font
-    # Save the modified workbook
-    reloaded_workbook.save(filename)
-    
   
-def process_folder(folder_name):
+def process_folder(folder_name, check_data_consistency = False):
     """Finds all student formfiles (all excel files) in a folder and performs advising checks on them
     
     Parameters:
@@ -783,6 +957,9 @@ def process_folder(folder_name):
     
     folder_name : string
         The path to the folder with the files
+
+    check_data_consistency : bool
+        if True, check that all entries of the student in the data bases have the same programme, name and email.
         
     Returns:
     --------
@@ -792,32 +969,118 @@ def process_folder(folder_name):
         by process_form_file_or_student_id()
     """
     
-    folder_entries = os.listdir(folder_name)
-    
-    form_files = []
-    for entry in folder_entries:
-        if (os.path.isfile(os.path.join(folder_name,entry)) and 
-            (entry.endswith('.xlsx') or entry.endswith('.xltx')) and
-             not entry.startswith('~$')): # this last bit is for when excel has the file open
-            form_files.append(entry)
+    # scandir can usually tell files from folders without another system call per entry
+    form_paths = []
+    with os.scandir(folder_name) as folder_entries:
+        for entry in folder_entries:
+            if (entry.name.endswith(('.xlsx', '.xltx')) and
+                not entry.name.startswith('~$') and # this is for when excel has the file open
+                entry.is_file()):
+                form_paths.append(entry.path)
             
-    if len(form_files) == 0:
+    if len(form_paths) == 0:
         raise(ValueError('there are no forms in the folder you have given me'))
     else:
-        list_of_data_frames = []
-        for filename in form_files:
-            this_data_frame = process_form_file_or_student_id(os.path.join(folder_name, filename))
-            list_of_data_frames.append(this_data_frame)
+        summary_data_frame = process_many(form_paths, check_data_consistency)
+
+        return summary_data_frame
+    
+def process_many(filenames, check_data_consistency = False):
+    """Performs advising checks on several form files (or student IDs) in parallel, using at most
+    one process per CPU core.
+    
+    Parameters:
+    -----------
+    
+    filenames : list of strings or ints
+        paths to filled-in module choice forms, or valid student IDs
+
+    check_data_consistency : bool
+        if True, check that all entries of the student in the data bases have the same programme, name and email.
+        
+    Returns:
+    --------
+    
+    summary_data_frame : pandas data frame
+        Data frame with one row per form file. Contains the same columns as the data frame returned
+        by process_form_file_or_student_id()
+    """
+    # the module catalogue is loaded when this module is imported, and the student data bases 
+    # when a worker process starts, so worker processes don't need to read them again per form file
+    list_of_summary_data = []
+    # at most one worker per file, otherwise the standard library picks the number (it knows the limit on Windows)
+    number_of_workers = len(filenames)
+    if number_of_workers == 0 or number_of_workers >= (os.cpu_count() or 1):
+        number_of_workers = None
+    with concurrent.futures.ProcessPoolExecutor(max_workers = number_of_workers, 
+                                                initializer = initialise_worker_process,
+                                                initargs = (sys.stdout.isatty(),)) as executor:
+        # the workers don't print, we print their reports here in order so that they don't get mixed up
+        # the workers may be started from scratch, so the options are passed along with each form
+        check_and_report = functools.partial(get_summary_data_and_report, check_data_consistency = check_data_consistency)
+        for this_summary_data, this_report in executor.map(check_and_report, filenames):
+            print(this_report, end = '')
             separation_string = '-'*60
             print(' ')
             print(separation_string)
             print(' ')
-        summary_data_frame = pd.concat(list_of_data_frames, ignore_index=True)
+            list_of_summary_data.append(this_summary_data)
+    
+    summary_data_frame = generate_summary_data_frame_from_list_of_entries(list_of_summary_data)
 
-        summary_data_frame = summary_data_frame.sort_values(by='Student ID')
+    # stable sort, so that students with the same ID keep the order of their files
+    summary_data_frame = summary_data_frame.sort_values(by='Student ID', kind='mergesort', ignore_index=True)
+    
+    return summary_data_frame
 
-        return summary_data_frame
+def initialise_worker_process(use_colours):
+    """Prepares a worker process of process_many() by reading in and indexing the student data bases.
     
+    Parameters:
+    -----------
+    
+    use_colours : bool
+        whether the main process prints to a terminal. The output of the workers is collected
+        before it is printed, so we need to tell termcolor to keep the colours.
+    """
+    if use_colours:
+        os.environ['FORCE_COLOR'] = '1'
+    try:
+        data_paths, modification_times = find_mms_data_files()
+        index_mms_data_bases(data_paths, modification_times)
+    except FileNotFoundError:
+        # we'll get the same error again when processing the first form, which is more helpful
+        # than a broken process pool
+        pass
+
+def get_summary_data_and_report(argument, check_data_consistency = False):
+    """Runs get_summary_data() and collects everything it prints, so that the report can be
+    printed by the main process.
+    
+    Parameters:
+    -----------
+    
+    argument : string or int
+        path to a filled-in module choice form or a valid student ID
+
+    check_data_consistency : bool
+        if True, check that all entries of the student in the data bases have the same programme, name and email.
+        
+    Returns:
+    --------
+    
+    summary_data : list
+        the results of all checks, as returned by get_summary_data()
+        
+    report : string
+        everything that was printed while checking the student
+    """
+    report = io.StringIO()
+    with contextlib.redirect_stdout(report):
+        summary_data = get_summary_data(argument, check_data_consistency = check_data_consistency)
+    
+    return summary_data, report.getvalue()
+
 def check_final_year_students():
     '''
     Go through the data base, identify final year students, and check their
@@ -833,7 +1096,7 @@ def check_final_year_students():
     # turn them all into data base files
     data_bases = get_all_mms_data_bases()
     processed_students = []
-    list_of_summary_data_frames = []
+    list_of_summary_data = []
     for this_data_base in data_bases:
         these_student_ids = this_data_base['Student ID'].unique()
         for student_id in these_student_ids:
@@ -845,16 +1108,16 @@ def check_final_year_students():
                 else:
                     student= student_or_warning
                     if student.current_honours_year >= student.expected_honours_years:
-                        this_summary_data_frame = process_form_file_or_student_id(student_id)
-                        list_of_summary_data_frames.append(this_summary_data_frame)
+                        this_summary_data = get_summary_data(student_id)
+                        list_of_summary_data.append(this_summary_data)
                         separation_string = '-'*60
                         print(' ')
                         print(separation_string)
                         print(' ')
 
-    summary_data_frame = pd.concat(list_of_summary_data_frames, ignore_index=True)
+    summary_data_frame = generate_summary_data_frame_from_list_of_entries(list_of_summary_data)
 
-    summary_data_frame_sorted = summary_data_frame.sort_values(by='Student ID')
+    summary_data_frame_sorted = summary_data_frame.sort_values(by='Student ID', kind='mergesort', ignore_index=True)
     
     summary_data_frame = summary_data_frame_sorted[~summary_data_frame_sorted['Unmet programme requirements'].str.contains("No programme requirements available", na=False)]
 
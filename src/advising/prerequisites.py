@@ -1,6 +1,19 @@
 import re
+import functools
 from .infrastructure import *
 
+# module codes are two capital letters followed by four digits, e.g. MT3501
+module_code_pattern = re.compile(r'[A-Z]{2}\d{4}')
+
+# a module code within a prerequisite string, possibly marked as a co-requisite
+prerequisite_module_pattern = re.compile(r'(?P<corequisite>co-requisite )?(?P<module_code>[A-Z]{2}\d{4})')
+
+# the words that can appear in prerequisite strings such as 'MT2503 and (MT3501 or co-requisite MT3502)'
+prerequisite_token_pattern = re.compile(r'\(|\)|[^\s()]+')
+
+# MT5867 requires two of these modules, see get_missing_prerequisites_for_module()
+mt5867_prerequisite_modules = frozenset(['MT3505', 'MT4003', 'MT4004', 'MT4512', 'MT4514', 'MT4515', 'MT4526'])
+
 def find_missing_prerequisites(student):
     """find any missing prerequisites or violated anti-requisites.
     
@@ -23,8 +36,12 @@ def find_missing_prerequisites(student):
     list_of_missed_prerequisites = []
     list_of_recommendations = []
     
+    # collect when each module is taken once, rather than for every module we check
+    planned_module_schedule = get_planned_module_schedule(student)
+    
     for module in student.planned_honours_modules:
-        these_missing_prerequisites, these_adviser_recommendations = get_missing_prerequisites_for_module(module, student)
+        these_missing_prerequisites, these_adviser_recommendations = get_missing_prerequisites_for_module(module, student, 
+                                                                                                          planned_module_schedule)
         list_of_missed_prerequisites += [these_missing_prerequisites]
         list_of_recommendations += [these_adviser_recommendations]
         
@@ -34,7 +51,31 @@ def find_missing_prerequisites(student):
 
     return missed_prerequisites, adviser_recommendations
     
-def get_missing_prerequisites_for_module(module, student):
+def get_planned_module_schedule(student):
+    """Collect the honours year and semester of each of the student's module choices.
+    
+    Parameters :
+    ------------
+    
+    student : instance of Student class
+        The student we are checking
+        
+    Returns :
+    ---------
+    
+    planned_module_schedule : list of tuples
+        one entry (module code, honours year, honours year number, semester) per row of 
+        student.honours_module_choices, e.g. ('MT3501', 'Year 1', 1, 'S1')
+    """
+    honours_module_choices = student.honours_module_choices
+    planned_module_schedule = [(module_code, honours_year, int(honours_year[-1]), semester)
+                               for module_code, honours_year, semester in zip(honours_module_choices['Module code'],
+                                                                              honours_module_choices['Honours year'],
+                                                                              honours_module_choices['Semester'])]
+    
+    return planned_module_schedule
+
+def get_missing_prerequisites_for_module(module, student, planned_module_schedule = None):
     """Find which prerequisites the student is missing for the given module.
     Will also check anti-requisites.
     
@@ -47,6 +88,10 @@ def get_missing_prerequisites_for_module(module, student):
     student : instance of Student class
         The student we are checking
         
+    planned_module_schedule : list of tuples
+        the output of get_planned_module_schedule() for this student. Will be generated 
+        if not provided.
+        
     Returns :
     ---------
 
@@ -60,36 +105,37 @@ def get_missing_prerequisites_for_module(module, student):
     missed_prerequisites_list = []
     adviser_recommendations_list = []
 
-    # find which year and semester the module is selected for
-    year_of_this_module = student.honours_module_choices[student.honours_module_choices['Module code'] == module]['Honours year'].values[0]
-    year_number_of_this_module = int(year_of_this_module[-1])
-    semester_of_this_module = student.honours_module_choices[student.honours_module_choices['Module code'] == module]['Semester'].values[0]
+    if planned_module_schedule is None:
+        planned_module_schedule = get_planned_module_schedule(student)
+
+    # find which year and semester the module is selected for (the first entry, if it is selected twice)
+    _, year_of_this_module, year_number_of_this_module, semester_of_this_module = next(
+        scheduled_module for scheduled_module in planned_module_schedule if scheduled_module[0] == module)
 
     # construct a list of all courses the student has taken by then
     # and construct a list of all modules the student is taking concurrently
-    previously_taken_modules = student.passed_modules.copy()
-    simultaneously_taken_modules = []
+
+    # these are sets since we only ever check whether modules are in them
+    previously_taken_modules = set(student.passed_modules)
+    simultaneously_taken_modules = set()
     # we need this one for anti-requisites below
-    modules_taken_in_same_year=[]
+    modules_taken_in_same_year = set()
 
-    for _, row in student.honours_module_choices.iterrows():
-        year_number = int(row['Honours year'][-1])
+    for module_code, honours_year, year_number, semester in planned_module_schedule:
         if year_number < year_number_of_this_module:
-            previously_taken_modules.append(row['Module code'])
+            previously_taken_modules.add(module_code)
         if semester_of_this_module == 'S2':
-            if row['Honours year'] == year_of_this_module and row['Semester'] == 'S1' :
-                previously_taken_modules.append(row['Module code'])
-        if (row['Honours year'] == year_of_this_module 
-            and row['Semester'] == semester_of_this_module
-            and row['Module code'] != module):
-            simultaneously_taken_modules.append(row['Module code'])
-        if (row['Honours year'] == year_of_this_module 
-            and row['Module code'] != module):
-            modules_taken_in_same_year.append(row['Module code'])
+            if honours_year == year_of_this_module and semester == 'S1':
+                previously_taken_modules.add(module_code)
+        if honours_year == year_of_this_module and module_code != module:
+            modules_taken_in_same_year.add(module_code)
+            if semester == semester_of_this_module:
+                simultaneously_taken_modules.add(module_code)
 
     # get pre-requisite string for that module
-    if len(module_catalogue[module_catalogue['Module code'] == module])> 0:
-        prerequisites = module_catalogue[module_catalogue['Module code'] == module]['Prerequisites'].values[0]
+    module_catalogue_entry = module_catalogue_dictionary.get(module)
+    if module_catalogue_entry is not None:
+        prerequisites = module_catalogue_entry['Prerequisites']
     else:
         # The student has chosen a module that doesn't exist. We have flagged this already in the programme requirements,
         # so don't need to do that again here.
@@ -111,47 +157,27 @@ def get_missing_prerequisites_for_module(module, student):
         elif prerequisites == 'Students must have gained admission onto an MSc programme':
             missed_prerequisites_list.append('Student cannot take module ' + module + ' as this module is only available to Msc students')
         else:
-            #now there is a boolean statement coming, so we turn the module codes into boolean strings and evaluate the outcome
-            # (thanks, ChatGPT)
-            module_codes = re.findall(r'[A-Z]{2}\d{4}', prerequisites)
-            parsed_prerequisites = prerequisites
-            for module_code in module_codes:
-                # co-requisites are preceded by the word co-requisite and don't have brackets after
-                if module_code in prerequisite_list:
-                    location_index = prerequisite_list.index(module_code)
-                    if location_index > 0:
-                        if prerequisite_list[location_index - 1] == 'co-requisite':
-                            if module_code in previously_taken_modules or module_code in simultaneously_taken_modules:
-                                parsed_prerequisites = parsed_prerequisites.replace(module_code, 'True')
-                            else:
-                                parsed_prerequisites = parsed_prerequisites.replace(module_code, 'False')
-                            parsed_prerequisites = parsed_prerequisites.replace('co-requisite ', '')
-                        else: 
-                            # the location index is larger than one but we are not at a co-requisite
-                            if module_code in previously_taken_modules:
-                                parsed_prerequisites = parsed_prerequisites.replace(module_code, 'True')
-                            else:
-                                parsed_prerequisites = parsed_prerequisites.replace(module_code, 'False')
-                    # the location index is zero and we just check the module code
-                    if module_code in previously_taken_modules:
-                        parsed_prerequisites = parsed_prerequisites.replace(module_code, 'True')
-                    else:
-                        parsed_prerequisites = parsed_prerequisites.replace(module_code, 'False')
-                else:
-                    if module_code in previously_taken_modules:
-                        parsed_prerequisites = parsed_prerequisites.replace(module_code, 'True')
-                    else:
-                        parsed_prerequisites = parsed_prerequisites.replace(module_code, 'False')
-            prerequisites_are_met = eval(parsed_prerequisites)
+            # now there is a boolean statement coming, so we parse it (once per prerequisite string)
+            # and evaluate it against the modules the student is taking
+            prerequisite_expression = parse_prerequisite_expression(prerequisites)
+            prerequisites_are_met = evaluate_prerequisite_expression(prerequisite_expression, 
+                                                                     previously_taken_modules, 
+                                                                     simultaneously_taken_modules)
             if not prerequisites_are_met:
+                # for the warning, write out the prerequisites with each module code replaced by True or False
+                parsed_prerequisites = prerequisite_module_pattern.sub(
+                    lambda match: str(prerequisite_module_is_met(match.group('module_code'), 
+                                                                 match.group('corequisite') is not None,
+                                                                 previously_taken_modules, 
+                                                                 simultaneously_taken_modules)),
+                    prerequisites)
                 missed_prerequisites_list.append('Student is missing prerequisite [' + prerequisites+ '] for module ' + module + 
                                                  ' ([' + parsed_prerequisites + '])')
             
     # MT5867 is a special case that I don't know how to parse automatically:
     if module == 'MT5867':
         prerequisites = 'two of (MT3505, MT4003, MT4004, MT4512, MT4514, MT4515, MT4526)'
-        list_of_modules = ['MT3505', 'MT4003', 'MT4004', 'MT4512', 'MT4514', 'MT4515', 'MT4526']
-        number_of_matching_modules = len(set.intersection(set(list_of_modules), set(previously_taken_modules)))
+        number_of_matching_modules = len(mt5867_prerequisite_modules.intersection(previously_taken_modules))
         if number_of_matching_modules <2:
             missed_prerequisites_list.append('Student is missing prerequisite [' + prerequisites + '] for module MT5867')
     
@@ -161,8 +187,8 @@ def get_missing_prerequisites_for_module(module, student):
     
     # now check anti-requisites:
     # to do so, get the anti-requisites
-    if len(module_catalogue[module_catalogue['Module code'] == module])> 0:
-        antirequisites = module_catalogue[module_catalogue['Module code'] == module]['Antirequisites'].values[0]
+    if module_catalogue_entry is not None:
+        antirequisites = module_catalogue_entry['Antirequisites']
     else:
         # The student has chosen a module that doesn't exist. We have flagged this already in the programme requirements,
         # so don't need to do that again here.
@@ -171,7 +197,7 @@ def get_missing_prerequisites_for_module(module, student):
 
     if isinstance(antirequisites, str):
         # check any listed module code individually
-        anti_module_codes = re.findall(r'[A-Z]{2}\d{4}', antirequisites)
+        anti_module_codes = module_code_pattern.findall(antirequisites)
         for module_code in anti_module_codes:
             if module_code in previously_taken_modules or module_code in simultaneously_taken_modules:
                 missed_prerequisites_list.append('Student selected antirequisite ' + module_code + ' for module ' + module)
@@ -183,3 +209,147 @@ def get_missing_prerequisites_for_module(module, student):
     
     return missed_prerequisites, adviser_recommendations
 
+def prerequisite_module_is_met(module_code, is_corequisite, previously_taken_modules, simultaneously_taken_modules):
+    """Check a single module code within a prerequisite string.
+    
+    Parameters :
+    ------------
+    
+    module_code : string
+        the required module
+        
+    is_corequisite : bool
+        whether the module may also be taken at the same time
+        
+    previously_taken_modules : set of strings
+        modules the student has taken before the module we are checking
+        
+    simultaneously_taken_modules : set of strings
+        modules the student is taking at the same time as the module we are checking
+        
+    Returns :
+    ---------
+    
+    module_is_met : bool
+        True if the student meets this part of the prerequisites
+    """
+    if module_code in previously_taken_modules:
+        return True
+    
+    return is_corequisite and module_code in simultaneously_taken_modules
+
+@functools.lru_cache(maxsize=None)
+def parse_prerequisite_expression(prerequisites):
+    """Parse a prerequisite string from the module catalogue, such as
+    'MT2503 and (MT3501 or co-requisite MT3502)', into a nested tuple.
+    As in python, 'and' binds more strongly than 'or'. The result is cached, since
+    the same prerequisite strings are parsed for every student.
+    
+    Parameters :
+    ------------
+    
+    prerequisites : string
+        the prerequisite entry of the module catalogue
+        
+    Returns :
+    ---------
+    
+    prerequisite_expression : tuple
+        either ('module', module_code, is_corequisite), or ('and', expressions) or ('or', expressions),
+        where expressions is a tuple of further prerequisite expressions
+    """
+    tokens = prerequisite_token_pattern.findall(prerequisites)
+    prerequisite_expression, token_index = parse_prerequisite_tokens(tokens, 0, prerequisites)
+    if token_index != len(tokens):
+        raise(ValueError('Could not parse prerequisites ' + prerequisites + '. Check the table entry.'))
+    
+    return prerequisite_expression
+
+def parse_prerequisite_tokens(tokens, token_index, prerequisites, operator = 'or'):
+    """Helper function for parse_prerequisite_expression(). Reads all terms that are joined by
+    the given operator, starting at token_index.
+    
+    Parameters :
+    ------------
+    
+    tokens : list of strings
+        the tokens of the prerequisite string
+        
+    token_index : int
+        the index of the first token we are reading
+        
+    prerequisites : string
+        the full prerequisite string, for error messages
+        
+    operator : string
+        'or' or 'and'
+        
+    Returns :
+    ---------
+    
+    prerequisite_expression : tuple
+        see parse_prerequisite_expression()
+        
+    token_index : int
+        the index of the first token that has not been read
+    """
+    terms = []
+    while True:
+        if operator == 'or':
+            term, token_index = parse_prerequisite_tokens(tokens, token_index, prerequisites, operator = 'and')
+        elif token_index < len(tokens) and tokens[token_index] == '(':
+            term, token_index = parse_prerequisite_tokens(tokens, token_index + 1, prerequisites)
+            if token_index == len(tokens) or tokens[token_index] != ')':
+                raise(ValueError('Could not parse prerequisites ' + prerequisites + '. Check the table entry.'))
+            token_index += 1
+        else:
+            is_corequisite = token_index < len(tokens) and tokens[token_index] == 'co-requisite'
+            if is_corequisite:
+                token_index += 1
+            if token_index == len(tokens) or not module_code_pattern.fullmatch(tokens[token_index]):
+                raise(ValueError('Could not parse prerequisites ' + prerequisites + '. Check the table entry.'))
+            term = ('module', tokens[token_index], is_corequisite)
+            token_index += 1
+        terms.append(term)
+        if token_index < len(tokens) and tokens[token_index] == operator:
+            token_index += 1
+        else:
+            break
+        
+    if len(terms) == 1:
+        return terms[0], token_index
+    
+    return (operator, tuple(terms)), token_index
+
+def evaluate_prerequisite_expression(prerequisite_expression, previously_taken_modules, simultaneously_taken_modules):
+    """Evaluate a parsed prerequisite expression for a student.
+    
+    Parameters :
+    ------------
+    
+    prerequisite_expression : tuple
+        generated with parse_prerequisite_expression()
+        
+    previously_taken_modules : set of strings
+        modules the student has taken before the module we are checking
+        
+    simultaneously_taken_modules : set of strings
+        modules the student is taking at the same time as the module we are checking
+        
+    Returns :
+    ---------
+    
+    prerequisites_are_met : bool
+        True if the student meets the prerequisites
+    """
+    if prerequisite_expression[0] == 'module':
+        _, module_code, is_corequisite = prerequisite_expression
+        return prerequisite_module_is_met(module_code, is_corequisite, previously_taken_modules, simultaneously_taken_modules)
+    
+    operator, terms = prerequisite_expression
+    term_values = (evaluate_prerequisite_expression(term, previously_taken_modules, simultaneously_taken_modules)
+                   for term in terms)
+    if operator == 'and':
+        return all(term_values)
+    else:
+        return any(term_values)
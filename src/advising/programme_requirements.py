@@ -1,4 +1,3 @@
-import collections
 from .infrastructure import *
 import pandas as pd
 
@@ -43,23 +42,18 @@ def find_missing_programme_requirements(student):
         list_of_missed_requirements.append('Year could not be inferred, student will require manual checking - flagged issues can be wrong')
 
     # do some sanity check on the module selection first. 
-    if len(set(student.full_module_list)) != len(student.full_module_list):
-        double_entry_counter = collections.Counter(student.full_module_list)
-        duplicate_entries = [module for module, count in double_entry_counter.items() if count > 1]
-        # ignore duplicate entries if student is retaking a failed module
-        filtered_duplicate_entries = []
-        for entry in duplicate_entries:
-            if (entry in student.modules_awaiting_reassessment) and (entry in student.planned_honours_modules):
-                pass
-            else:
-                filtered_duplicate_entries.append(entry)
-        if len(filtered_duplicate_entries) > 0:
-            warning_string = 'Student selected the following modules twice: '
-            for entry in duplicate_entries:
-                warning_string += entry
-                if entry != duplicate_entries[-1]:
-                    warning_string += ', '
-            list_of_missed_requirements.append(warning_string)
+    seen_modules = set()
+    duplicate_entries = set()
+    for module in student.full_module_list:
+        if module in seen_modules:
+            duplicate_entries.add(module)
+        seen_modules.add(module)
+    # ignore duplicate entries if student is retaking a failed module
+    filtered_duplicate_entries = [entry for entry in duplicate_entries 
+                                  if not ((entry in student.modules_awaiting_reassessment) and (entry in student.planned_honours_modules))]
+    if len(filtered_duplicate_entries) > 0:
+        warning_string = 'Student selected the following modules twice: ' + ', '.join(sorted(duplicate_entries))
+        list_of_missed_requirements.append(warning_string)
         
     # flag up z-coded and deferred modules
     if len(student.z_coded_modules) > 0:
@@ -157,34 +151,27 @@ def find_missing_programme_requirements(student):
         # if len(list_of_all_non_honours_modules) >2:
         #     list_of_missed_requirements.append('Student is taking more than 2 modules as dip-down or dip-across, which is not allowed.')
             
-        list_of_all_MT_modules = [module for module in student.all_honours_modules if 'MT3' in module 
-                                                                                        or 'MT4' in module 
-                                                                                        or 'MT5' in module
-                                                                                        or 'ID4001' in module
-                                                                                        or 'ID5059' in module]
+        list_of_all_MT_modules = (student.honours_modules_by_level['MT3'] + student.honours_modules_by_level['MT4'] + student.honours_modules_by_level['MT5'] +
+                                  student.honours_modules_by_level['ID4001'] + student.honours_modules_by_level['ID5059'])
 
         if len(list_of_all_MT_modules) <14:
             list_of_missed_requirements.append('Student is taking more than 2 modules as dip-down or dip-across, which is not allowed')
  
         # check that there are at least 90 credits (6 modules) at 4000 level or above
-        list_of_4000_and_5000_modules = [module for module in student.all_honours_modules if 'MT4' in module or 'MT5' in module]
+        list_of_4000_and_5000_modules = student.honours_modules_by_level['MT4'] + student.honours_modules_by_level['MT5']
         if len(list_of_4000_and_5000_modules) <6:
             list_of_missed_requirements.append('Student is not planning to take enough credits at 4000 level or above')
 
         # remind advisers to get permissions
-        list_of_planned_5000_level_modules = [module for module in student.planned_honours_modules if 'MT5' in module or 'ID5059' in module]
+        list_of_planned_5000_level_modules = student.planned_modules_by_level['MT5'] + student.planned_modules_by_level['ID5059']
         if len(list_of_planned_5000_level_modules) >0:
             list_of_adviser_recommendations.append('Student is planning to take 5000 level modules (which will require permission)')
 
-        list_of_2000_level_modules = [module for module in student.planned_honours_modules if 'MT2' in module]
+        list_of_2000_level_modules = student.planned_modules_by_level['MT2']
         if len(list_of_2000_level_modules) >0:
             list_of_adviser_recommendations.append('Student is planning to take 2000 level modules (which will require permission)')
 
-        list_of_planned_non_maths_modules = [module for module in student.planned_honours_modules if 'MT2' not in module 
-                                                                                        and 'MT3' not in module 
-                                                                                        and 'MT4' not in module 
-                                                                                        and 'MT5' not in module
-                                                                                        and 'ID5059' not in module]
+        list_of_planned_non_maths_modules = student.planned_modules_by_level['ID4001'] + student.planned_modules_by_level['other']
 
         if len(list_of_planned_non_maths_modules) >0:
             list_of_adviser_recommendations.append('Student is planning to take non-MT modules, which requires permission and may affect credit balance')
@@ -226,29 +213,22 @@ def find_missing_programme_requirements(student):
                 list_of_missed_requirements.append('Student is not taking their final year project in their final year.')
         
         # check dip-down and dip-across: no more than two modules should be outside of MT3X to MT5X
-        list_of_all_MT_modules = [module for module in student.all_honours_modules if 'MT3' in module 
-                                                                                        or 'MT4' in module 
-                                                                                        or 'MT5' in module
-                                                                                        or 'ID4001' in module
-                                                                                        or 'ID5059' in module]
+        list_of_all_MT_modules = (student.honours_modules_by_level['MT3'] + student.honours_modules_by_level['MT4'] + student.honours_modules_by_level['MT5'] +
+                                  student.honours_modules_by_level['ID4001'] + student.honours_modules_by_level['ID5059'])
 
         if len(list_of_all_MT_modules) <21:
             list_of_missed_requirements.append('Student is taking more than 2 modules as dip-down or dip-across, which is not allowed')
 
         # check that there are at least 120 credits (7 modules) at 5000 level
-        list_of_5000_modules = [module for module in student.all_honours_modules if 'MT5' in module or 'ID5059' in module]
+        list_of_5000_modules = student.honours_modules_by_level['MT5'] + student.honours_modules_by_level['ID5059']
         if len(list_of_5000_modules) <7:
             list_of_missed_requirements.append('Student is not planning to take enough credits at 5000 level')
 
-        list_of_2000_level_modules = [module for module in student.planned_honours_modules if 'MT2' in module]
+        list_of_2000_level_modules = student.planned_modules_by_level['MT2']
         if len(list_of_2000_level_modules) >0:
             list_of_adviser_recommendations.append('Student is planning to take 2000 level modules (which will require permission)')
 
-        list_of_planned_non_maths_modules = [module for module in student.planned_honours_modules if 'MT2' not in module 
-                                                                                        and 'MT3' not in module 
-                                                                                        and 'MT4' not in module 
-                                                                                        and 'MT5' not in module
-                                                                                        and 'ID5059' not in module]
+        list_of_planned_non_maths_modules = student.planned_modules_by_level['ID4001'] + student.planned_modules_by_level['other']
         if len(list_of_planned_non_maths_modules) >0:
             list_of_adviser_recommendations.append('Student is planning to take non-MT modules, which requires permission and may affect credit balance')
             
@@ -295,27 +275,20 @@ def find_missing_programme_requirements(student):
                 list_of_missed_requirements.append('Student is not taking their final year project in their final year.')
         
         # check dip-down and dip-across: no more than two modules should be outside of MT3X to MT5X
-        list_of_all_non_honours_modules = [module for module in student.all_honours_modules if 'MT3' not in module 
-                                                                                        and 'MT4' not in module 
-                                                                                        and 'MT5' not in module
-                                                                                        and 'ID5059' not in module]
+        list_of_all_non_honours_modules = student.honours_modules_by_level['MT2'] + student.honours_modules_by_level['ID4001'] + student.honours_modules_by_level['other']
         if len(list_of_all_non_honours_modules) >2:
             list_of_missed_requirements.append('Student is taking more than 2 modules as dip-down or dip-across, which is not allowed')
 
         # check that there are at least 120 credits (7 modules) at 5000 level or above
-        list_of_5000_modules = [module for module in student.all_honours_modules if 'MT5' in module]
+        list_of_5000_modules = student.honours_modules_by_level['MT5']
         if len(list_of_5000_modules) <7:
             list_of_missed_requirements.append('Student is not planning to take enough credits at 5000 level')
 
-        list_of_2000_level_modules = [module for module in student.planned_honours_modules if 'MT2' in module]
+        list_of_2000_level_modules = student.planned_modules_by_level['MT2']
         if len(list_of_2000_level_modules) >0:
             list_of_adviser_recommendations.append('Student is planning to take 2000 level modules (which will require permission)')
 
-        list_of_planned_non_maths_modules = [module for module in student.planned_honours_modules if 'MT2' not in module 
-                                                                                        and 'MT3' not in module 
-                                                                                        and 'MT4' not in module 
-                                                                                        and 'MT5' not in module
-                                                                                        and 'ID5059' not in module]
+        list_of_planned_non_maths_modules = student.planned_modules_by_level['ID4001'] + student.planned_modules_by_level['other']
         if len(list_of_planned_non_maths_modules) >0:
             list_of_adviser_recommendations.append('Student is planning to take non-MT modules, which requires permission and may affect credit balance')
 
@@ -362,23 +335,17 @@ def find_missing_programme_requirements(student):
         #                                                                                 and 'MT5' not in module
         #                                                                                 and 'ID5059' not in module]
 
-        list_of_all_MT_modules = [module for module in student.all_honours_modules if 'MT3' in module 
-                                                                                        or 'MT4' in module 
-                                                                                        or 'MT5' in module
-                                                                                        or 'ID5059' in module]
+        list_of_all_MT_modules = (student.honours_modules_by_level['MT3'] + student.honours_modules_by_level['MT4'] + student.honours_modules_by_level['MT5'] +
+                                  student.honours_modules_by_level['ID5059'])
 
         if len(list_of_all_MT_modules) <21:
             list_of_missed_requirements.append('Student is taking more than 2 modules as dip-down or dip-across, which is not allowed')
             
-        list_of_2000_level_modules = [module for module in student.planned_honours_modules if 'MT2' in module]
+        list_of_2000_level_modules = student.planned_modules_by_level['MT2']
         if len(list_of_2000_level_modules) >0:
             list_of_adviser_recommendations.append('Student is planning to take 2000 level modules (which will require permission)')
 
-        list_of_planned_non_maths_modules = [module for module in student.planned_honours_modules if 'MT2' not in module 
-                                                                                        and 'MT3' not in module 
-                                                                                        and 'MT4' not in module 
-                                                                                        and 'MT5' not in module
-                                                                                        and 'ID5059' not in module]
+        list_of_planned_non_maths_modules = student.planned_modules_by_level['ID4001'] + student.planned_modules_by_level['other']
         if len(list_of_planned_non_maths_modules) >0:
             list_of_adviser_recommendations.append('Student is planning to take non-MT modules, which requires permission and may affect credit balance')
  
@@ -426,27 +393,20 @@ def find_missing_programme_requirements(student):
                 list_of_missed_requirements.append('Student is not taking their final year project in their final year.')
         
         # check dip-down and dip-across: no more than two modules should be outside of MT3X to MT5X
-        list_of_all_non_honours_modules = [module for module in student.all_honours_modules if 'MT3' not in module 
-                                                                                        and 'MT4' not in module 
-                                                                                        and 'MT5' not in module
-                                                                                        and 'ID5059' not in module]
+        list_of_all_non_honours_modules = student.honours_modules_by_level['MT2'] + student.honours_modules_by_level['ID4001'] + student.honours_modules_by_level['other']
         if len(list_of_all_non_honours_modules) >2:
             list_of_missed_requirements.append('Student is taking more than 2 modules as dip-down or dip-across, which is not allowed')
 
         # check that there are at least 120 credits (7 modules) at 5000 level or above
-        list_of_5000_modules = [module for module in student.all_honours_modules if 'MT5' in module or 'ID5059' in module]
+        list_of_5000_modules = student.honours_modules_by_level['MT5'] + student.honours_modules_by_level['ID5059']
         if len(list_of_5000_modules) <7:
             list_of_missed_requirements.append('Student is not planning to take enough credits at 5000 level')
 
-        list_of_2000_level_modules = [module for module in student.planned_honours_modules if 'MT2' in module]
+        list_of_2000_level_modules = student.planned_modules_by_level['MT2']
         if len(list_of_2000_level_modules) >0:
             list_of_adviser_recommendations.append('Student is planning to take 2000 level modules (which will require permission)')
 
-        list_of_planned_non_maths_modules = [module for module in student.planned_honours_modules if 'MT2' not in module 
-                                                                                        and 'MT3' not in module 
-                                                                                        and 'MT4' not in module 
-                                                                                        and 'MT5' not in module
-                                                                                        and 'ID5059' not in module]
+        list_of_planned_non_maths_modules = student.planned_modules_by_level['ID4001'] + student.planned_modules_by_level['other']
         if len(list_of_planned_non_maths_modules) >0:
             list_of_adviser_recommendations.append('Student is planning to take non-MT modules, which requires permission and may affect credit balance')
 
@@ -499,32 +459,25 @@ def find_missing_programme_requirements(student):
             list_of_missed_requirements.append('Student is taking a module in MT4794-MT4797')
  
         # check dip-down and dip-across: no more than two modules should be outside of MT3X to MT5X
-        list_of_all_non_honours_modules = [module for module in student.all_honours_modules if 'MT3' not in module 
-                                                                                        and 'MT4' not in module 
-                                                                                        and 'MT5' not in module
-                                                                                        and 'ID5059' not in module]
+        list_of_all_non_honours_modules = student.honours_modules_by_level['MT2'] + student.honours_modules_by_level['ID4001'] + student.honours_modules_by_level['other']
         if len(list_of_all_non_honours_modules) >2:
             list_of_missed_requirements.append('Student is taking more than 2 modules as dip-down or dip-across, which is not allowed')
 
         # check that there are at least 90 credits (6 modules) at 4000 level or above
-        list_of_4000_and_5000_modules = [module for module in student.all_honours_modules if 'MT4' in module or 'MT5' in module]
+        list_of_4000_and_5000_modules = student.honours_modules_by_level['MT4'] + student.honours_modules_by_level['MT5']
         if len(list_of_4000_and_5000_modules) <6:
             list_of_missed_requirements.append('Student is not planning to take enough credits at 4000 level or above')
 
         # remind advisers to get permissions
-        list_of_planned_5000_level_modules = [module for module in student.planned_honours_modules if 'MT5' in module]
+        list_of_planned_5000_level_modules = student.planned_modules_by_level['MT5']
         if len(list_of_planned_5000_level_modules) >0:
             list_of_adviser_recommendations.append('Student is planning to take 5000 level modules (which will require permission)')
 
-        list_of_2000_level_modules = [module for module in student.planned_honours_modules if 'MT2' in module]
+        list_of_2000_level_modules = student.planned_modules_by_level['MT2']
         if len(list_of_2000_level_modules) >0:
             list_of_adviser_recommendations.append('Student is planning to take 2000 level modules (which will require permission)')
 
-        list_of_planned_non_maths_modules = [module for module in student.planned_honours_modules if 'MT2' not in module 
-                                                                                        and 'MT3' not in module 
-                                                                                        and 'MT4' not in module 
-                                                                                        and 'MT5' not in module
-                                                                                        and 'ID5059' not in module]
+        list_of_planned_non_maths_modules = student.planned_modules_by_level['ID4001'] + student.planned_modules_by_level['other']
         if len(list_of_planned_non_maths_modules) >0:
             list_of_adviser_recommendations.append('Student is planning to take non-MT modules, which requires permission and may affect credit balance')
  
@@ -1031,60 +984,55 @@ def check_for_120_credits_each_year(student):
     
     current_honours_year_string = 'Year ' + str(student.current_honours_year)
     
+    # count the planned and passed modules for all honours years and semesters in one go
+    data_base_of_all_modules = pd.concat([student.honours_module_choices, student.passed_module_table], ignore_index=True)
+    number_of_modules_per_year = data_base_of_all_modules.groupby('Honours year').size()
+    if 'Credits' in data_base_of_all_modules.columns:
+        credits_per_year = data_base_of_all_modules.groupby('Honours year')['Credits'].sum()
+    else:
+        credits_per_year = None
+    number_of_modules_per_semester = data_base_of_all_modules.groupby(['Honours year', 'Semester']).size()
+    # final year projects are not counted when we look at the split of the final year
+    is_final_year_project = ( ( (data_base_of_all_modules['Honours year'] == 'Year 2') & (data_base_of_all_modules['Module code'] == 'MT4599') ) |
+                              ( (data_base_of_all_modules['Honours year'] == 'Year 3') & (data_base_of_all_modules['Module code'] == 'MT5599') ) )
+    number_of_non_project_modules_per_semester = data_base_of_all_modules[~is_final_year_project].groupby(['Honours year', 'Semester']).size()
+
     #checking total number of modules
     for honours_year in honours_years:
-        this_planned_data_base = student.honours_module_choices[student.honours_module_choices['Honours year'] == honours_year]
-        this_passed_data_base = student.passed_module_table[student.passed_module_table['Honours year'] == honours_year]
-        this_data_base = pd.concat([this_planned_data_base, this_passed_data_base], ignore_index=True) 
+        number_of_modules = number_of_modules_per_year.get(honours_year, 0)
+        if credits_per_year is not None:
+            definitely_undercrediting = credits_per_year.get(honours_year, 0) < 120
+        else:
+            definitely_undercrediting = True
 
         if honours_year == 'Year 1' or honours_year == 'Year 2':
-            if len(this_data_base)<8:
-                if 'Credits' in this_data_base.columns:
-                    if this_data_base['Credits'].sum()<120:
-                        definitely_undercrediting = True
-                    else:
-                        definitely_undercrediting = False
-                else:
-                    definitely_undercrediting = True
+            if number_of_modules<8:
                 if definitely_undercrediting:
                     list_of_missed_requirements.append('Not collecting 120 credits in ' + honours_year)
-            elif len(this_data_base) > 8 and honours_year ==current_honours_year_string :
+            elif number_of_modules > 8 and honours_year ==current_honours_year_string :
                 list_of_adviser_recommendations.append('Student is planning to overcredit, which requires permission')
         if honours_year == 'Year 3':
-            if len(this_data_base)<7:
-                if 'Credits' in this_data_base.columns:
-                    if this_data_base['Credits'].sum()<120:
-                        definitely_undercrediting = True
-                    else:
-                        definitely_undercrediting = False
-                else:
-                    definitely_undercrediting = True
+            if number_of_modules<7:
                 if definitely_undercrediting:
                     list_of_missed_requirements.append('Not collecting 120 credits in ' + honours_year)
-            if ( len(this_data_base)>7 and honours_year == current_honours_year_string ):
+            if ( number_of_modules>7 and honours_year == current_honours_year_string ):
                 list_of_adviser_recommendations.append('Student is planning to overcredit, which requires permission')
     
     #checking moduel splits
     for honours_year in honours_years:
-        this_planned_data_base = student.honours_module_choices[student.honours_module_choices['Honours year'] == honours_year]
-        this_passed_data_base = student.passed_module_table[student.passed_module_table['Honours year'] == honours_year]
-        this_data_base = pd.concat([this_planned_data_base, this_passed_data_base], ignore_index=True) 
         if honours_year == 'Year 1' or (honours_year == 'Year 2' and student.expected_honours_years == 3):
             for semester in ['S1', 'S2']:
-                this_smaller_data_base = this_data_base[this_data_base['Semester'] == semester]
-                if len(this_smaller_data_base) !=4:
+                if number_of_modules_per_semester.get((honours_year, semester), 0) !=4:
                     list_of_adviser_recommendations.append('Not taking even credit split in ' + honours_year)
         elif honours_year == 'Year 2':
-            this_reduced_data_base = this_data_base[this_data_base['Module code'] != 'MT4599']
-            semester_1_modules = this_reduced_data_base[this_reduced_data_base['Semester'] == 'S1']['Module code']
-            semester_2_modules = this_reduced_data_base[this_reduced_data_base['Semester'] == 'S2']['Module code']
-            if len(semester_1_modules) != 4 or len(semester_2_modules) != 3:
+            number_of_semester_1_modules = number_of_non_project_modules_per_semester.get((honours_year, 'S1'), 0)
+            number_of_semester_2_modules = number_of_non_project_modules_per_semester.get((honours_year, 'S2'), 0)
+            if number_of_semester_1_modules != 4 or number_of_semester_2_modules != 3:
                 list_of_adviser_recommendations.append('Student is taking a high course load in second semester of final honours year so should ensure the majority of their project is completed before the start of S2')
         elif honours_year == 'Year 3':
-            this_reduced_data_base = this_data_base[this_data_base['Module code'] != 'MT5599']
-            semester_1_modules = this_reduced_data_base[this_reduced_data_base['Semester'] == 'S1']['Module code']
-            semester_2_modules = this_reduced_data_base[this_reduced_data_base['Semester'] == 'S2']['Module code']
-            if not ((len(semester_1_modules) == 3 and len(semester_2_modules) == 3) or (len(semester_1_modules) == 4 and len(semester_2_modules) == 2)):
+            number_of_semester_1_modules = number_of_non_project_modules_per_semester.get((honours_year, 'S1'), 0)
+            number_of_semester_2_modules = number_of_non_project_modules_per_semester.get((honours_year, 'S2'), 0)
+            if not ((number_of_semester_1_modules == 3 and number_of_semester_2_modules == 3) or (number_of_semester_1_modules == 4 and number_of_semester_2_modules == 2)):
                 list_of_adviser_recommendations.append('Student is taking a high course load second semester of final honours year (which may make project completion difficult)')
     
     missed_requirement = merge_list_to_long_string(list_of_missed_requirements)
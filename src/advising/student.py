@@ -1,5 +1,9 @@
 import pandas as pd
 
+# module code prefixes of maths modules at 2000 level and above, see classify_modules_by_level()
+maths_module_prefixes = ('MT2', 'MT3', 'MT4', 'MT5')
+
+
 class Student():
     def __init__(self, 
                  student_id, 
@@ -76,16 +80,23 @@ class Student():
         self.passed_honours_modules = passed_honours_modules
         self.honours_module_choices = honours_module_choices
 
+        planned_module_codes = self.honours_module_choices['Module code'].tolist()
+
         # for convenience also make a list of all selected and taken modules
-        self.full_module_list = self.passed_modules.copy()
-        self.full_module_list += self.honours_module_choices['Module code'].to_list()
+        self.full_module_list = self.passed_modules + planned_module_codes
+        # and a set of the same modules for counting them quickly
+        self.full_module_set = set(self.full_module_list)
         
-        # and a list of all selected and taken honours modules
-        self.all_honours_modules = self.passed_honours_modules
-        self.all_honours_modules += self.honours_module_choices['Module code'].tolist()
+        # and a list of all selected and taken honours modules. This needs to be a new list,
+        # otherwise adding the planned modules would also add them to passed_honours_modules
+        self.all_honours_modules = self.passed_honours_modules + planned_module_codes
         
         # and a list of planned honours modules
-        self.planned_honours_modules = self.honours_module_choices['Module code'].tolist()
+        self.planned_honours_modules = planned_module_codes
+
+        # sort the honours modules by level once, the programme requirement checks use this
+        self.honours_modules_by_level = classify_modules_by_level(self.all_honours_modules)
+        self.planned_modules_by_level = classify_modules_by_level(self.planned_honours_modules)
     
     def update_honours_module_choices(self, additional_honours_module_choices):
         '''add planned honours module choices to student.
@@ -99,8 +110,11 @@ class Student():
         '''
         self.honours_module_choices = pd.concat([self.honours_module_choices, additional_honours_module_choices])
         self.full_module_list += additional_honours_module_choices['Module code'].to_list()
+        self.full_module_set.update(additional_honours_module_choices['Module code'])
         self.all_honours_modules += additional_honours_module_choices['Module code'].tolist()
         self.planned_honours_modules += additional_honours_module_choices['Module code'].tolist()
+        self.honours_modules_by_level = classify_modules_by_level(self.all_honours_modules)
+        self.planned_modules_by_level = classify_modules_by_level(self.planned_honours_modules)
 
     def get_number_of_modules_in_list(self, module_list):
         """Get the number of modules that the student is taking in the module list. Already passed modules and scheduled
@@ -118,7 +132,35 @@ class Student():
         number_of_modules : int
             the number of modules in the given list that the student is taking.
         """
-        number_of_modules = len(set.intersection(set(self.full_module_list),set(module_list)))
+        number_of_modules = len(self.full_module_set.intersection(module_list))
         
         return number_of_modules
- 
\ No newline at end of file
+ 
+
+def classify_modules_by_level(modules):
+    """Sort module codes into maths modules at each level in a single pass. ID4001 and ID5059 count
+    as maths modules for some programme requirements, so they are kept separately.
+    
+    Parameters :
+    ------------
+    
+    modules : list of strings
+        the module codes to sort
+        
+    Returns :
+    ---------
+    
+    modules_by_level : dictionary
+        the keys are 'MT2', 'MT3', 'MT4', 'MT5', 'ID4001', 'ID5059' and 'other', the values are
+        lists of the module codes in each group
+    """
+    modules_by_level = {'MT2': [], 'MT3': [], 'MT4': [], 'MT5': [], 'ID4001': [], 'ID5059': [], 'other': []}
+    for module in modules:
+        if module[:3] in maths_module_prefixes:
+            modules_by_level[module[:3]].append(module)
+        elif module == 'ID4001' or module == 'ID5059':
+            modules_by_level[module].append(module)
+        else:
+            modules_by_level['other'].append(module)
+    
+    return modules_by_level
@@ -1,3 +1,5 @@
+import collections
+import functools
 from .infrastructure import *
 
 def find_timetable_clashes(student):
@@ -23,38 +25,70 @@ def find_timetable_clashes(student):
     timetable_clashes_list = []
     adviser_recommendations_list = []
     
+    # collect the modules of each honours year and semester in a single pass over the module choices
+    modules_by_year_and_semester = collections.defaultdict(list)
+    for module, honours_year, semester in zip(student.honours_module_choices['Module code'],
+                                              student.honours_module_choices['Honours year'],
+                                              student.honours_module_choices['Semester']):
+        modules_by_year_and_semester[(honours_year, semester)].append(module)
+
     # get remaining honours years
     remaining_honours_years = student.honours_module_choices['Honours year'].unique()
     for honours_year in remaining_honours_years:
         for semester in ['S1', 'S2']:
-            semester_modules = student.honours_module_choices[(student.honours_module_choices['Semester'] == semester) &  
-                                                               (student.honours_module_choices['Honours year'] == honours_year)]['Module code'].to_list()
+            semester_modules = modules_by_year_and_semester.get((honours_year, semester), [])
             timeslot_dictionary = dict()
             for module in semester_modules:
                 these_timeslots = get_timeslots_for_module(module)
                 timeslot_dictionary[module] = these_timeslots
             
-            timetable_clashes_list += find_clashing_timeslots_and_modules(timeslot_dictionary, honours_year, semester)
-            reduced_timeslot_dictionary = timeslot_dictionary.copy()
-            for _,value in reduced_timeslot_dictionary.items():
-                for entry in value:
-                    entry.replace(' (even weeks)','')
-            timetable_clashes_list += find_clashing_timeslots_and_modules(timeslot_dictionary, honours_year, semester)
-
-            reduced_timeslot_dictionary = timeslot_dictionary.copy()
-            for _,value in reduced_timeslot_dictionary.items():
-                for entry in value:
-                    entry.replace(' (odd weeks)','')
+            # a weekly timeslot clashes with the same timeslot in odd or even weeks, 
+            # but odd and even weeks don't clash with each other
+            timeslot_dictionary = split_weekly_timeslots(timeslot_dictionary)
             timetable_clashes_list += find_clashing_timeslots_and_modules(timeslot_dictionary, honours_year, semester)
 
-    # remove duplicate items
-    timetable_clashes_list = list(set(timetable_clashes_list))
     # merge all found problems into a string
     timetable_clashes = merge_list_to_long_string(timetable_clashes_list)
     adviser_recommendations = merge_list_to_long_string(adviser_recommendations_list)
     
     return timetable_clashes, adviser_recommendations
  
+def split_weekly_timeslots(timeslot_dictionary):
+    """Replace weekly timeslots by separate odd-week and even-week timeslots if any module in the 
+    dictionary only runs in odd or even weeks at that time. For example, if one module runs at 
+    '11am Mon (odd weeks)', then '11am Mon' becomes '11am Mon (odd weeks)' and '11am Mon (even weeks)', so that
+    clashes with the fortnightly module can be found by comparing timeslots.
+    
+    Parameters:
+    -----------
+    
+    timeslot_dictionary : dictionary
+        keys are module codes, values are lists of strings, which represent timeslots
+        
+    Returns:
+    --------
+    
+    split_timeslot_dictionary : dictionary
+        same keys as timeslot_dictionary, with weekly timeslots split where necessary
+    """
+    fortnightly_timeslots = set()
+    for timeslots in timeslot_dictionary.values():
+        for timeslot in timeslots:
+            if timeslot.endswith(' (odd weeks)') or timeslot.endswith(' (even weeks)'):
+                fortnightly_timeslots.add(timeslot.replace(' (odd weeks)', '').replace(' (even weeks)', ''))
+    
+    split_timeslot_dictionary = dict()
+    for module, timeslots in timeslot_dictionary.items():
+        split_timeslots = []
+        for timeslot in timeslots:
+            if timeslot in fortnightly_timeslots:
+                split_timeslots += [timeslot + ' (odd weeks)', timeslot + ' (even weeks)']
+            else:
+                split_timeslots.append(timeslot)
+        split_timeslot_dictionary[module] = split_timeslots
+    
+    return split_timeslot_dictionary
+
 def find_clashing_timeslots_and_modules(module_dictionary, honours_year, semester):
     """Given timeslot and a dictionary of concurrently running modules return the timeslots that are clashing and the clashing module codes
     
@@ -77,41 +111,22 @@ def find_clashing_timeslots_and_modules(module_dictionary, honours_year, semeste
         warning messages about clashing modules
     """
     timetable_clashes_list = []
-    all_timeslots = []
+    # collect which modules run at each timeslot in one pass
+    modules_at_timeslot = collections.defaultdict(list)
     for module, timeslots in module_dictionary.items():
-        all_timeslots += timeslots
+        for timeslot in timeslots:
+            modules_at_timeslot[timeslot].append(module)
 
-    my_timeslot_counter = collections.Counter(all_timeslots)
-    duplicate_entries = [timeslot for timeslot, count in my_timeslot_counter.items() if count > 1]
-    clashing_module_codes = []
-    for timeslot in duplicate_entries:
-        these_clashing_module_codes = []
-        for module, timeslot_list in module_dictionary.items():
-            if timeslot in timeslot_list:
-                these_clashing_module_codes.append(module)
-        these_clashing_module_codes.sort()
-        these_clashing_module_codes = tuple(these_clashing_module_codes)
-        clashing_module_codes.append(these_clashing_module_codes)
-        
-    unique_module_clashes = list(set(frozenset(entry) for entry in clashing_module_codes))
-    for module_combination in unique_module_clashes:
-        all_timeslot_sets = list()
-        for module in module_combination:
-            module_timeslots = set(module_dictionary[module])
-            all_timeslot_sets.append(module_timeslots)
-        affected_timeslots = set.intersection(*all_timeslot_sets)
-        # sort the list so that we can avoid duplicate warning in the if statement below
-        warning_string = 'Clash for ' + honours_year + ' ' + semester + ' between modules '
-        for module_index, module in enumerate(module_combination):
-            warning_string += module
-            if module_index < len(module_combination) - 1:
-                warning_string += ' and '
-        warning_string += ' at ' 
-        for timeslot_index, timeslot in enumerate(affected_timeslots):
-            warning_string += timeslot
-            if timeslot_index < len(affected_timeslots) - 1:
-                warning_string += ' and '
-        # if warning_string not in timetable_clashes_list:
+    # group the clashing timeslots by the modules that clash there
+    clashing_timeslots_for_modules = collections.defaultdict(list)
+    for timeslot, modules in modules_at_timeslot.items():
+        if len(modules) > 1:
+            clashing_timeslots_for_modules[frozenset(modules)].append(timeslot)
+
+    for module_combination, affected_timeslots in clashing_timeslots_for_modules.items():
+        # sort modules and timeslots so that the warning is the same for every run
+        warning_string = ('Clash for ' + honours_year + ' ' + semester + ' between modules ' + 
+                          ' and '.join(sorted(module_combination)) + ' at ' + ' and '.join(sorted(affected_timeslots)))
         timetable_clashes_list.append(warning_string)
     
     return timetable_clashes_list
@@ -131,16 +146,40 @@ def get_timeslots_for_module(module):
     timeslots : list of strings
         all timeslots that the module is running in
     """
-    if len(module_catalogue[module_catalogue['Module code'] == module]) == 0:
+    # copy the cached timeslots so that callers can't change them
+    timeslots = list(parse_timeslots_for_module(module))
+    
+    return timeslots
+
+@functools.lru_cache(maxsize=None)
+def parse_timeslots_for_module(module):
+    """Reads the timetable entry of a module in the module catalogue and splits it into timeslots. 
+    This only depends on the module catalogue, so the result is cached. Use get_timeslots_for_module() 
+    instead of calling this function directly.
+    
+    Parameters:
+    -----------
+    
+    module : string
+        the module code we are interested in.
+        
+    Returns:
+    --------
+    
+    timeslots : tuple of strings
+        all timeslots that the module is running in
+    """
+    module_catalogue_entry = module_catalogue_dictionary.get(module)
+    if module_catalogue_entry is None:
         # The module does not exist, we have already flagged this
         timeslot_entry = float('nan')
     else:
-        timeslot_entry = module_catalogue[module_catalogue['Module code'] == module]['Timetable'].values[0]
+        timeslot_entry = module_catalogue_entry['Timetable']
     timeslots = []
     
     # special treatment for MT4112 bewcause I can't be bothered to update the parsing below, it'd be a pain
     if timeslot_entry == '10am Wed (odd weeks), 10am Fri (odd weeks)':
-        timeslots = ['10am Wed (odd weeks)', '10am Fri (odd weeks)']
+        timeslots = ('10am Wed (odd weeks)', '10am Fri (odd weeks)')
         return timeslots
 
     if isinstance(timeslot_entry,str):
@@ -175,7 +214,47 @@ def get_timeslots_for_module(module):
             timeslots.append(this_timeslot)
             current_index +=2
         
-    return timeslots
+    return tuple(timeslots)
+
+@functools.lru_cache(maxsize=None)
+def get_running_academic_years(module):
+    """Returns the academic years in which a module is running. This only depends on the module
+    catalogue, so the result is cached.
+    
+    Parameters:
+    -----------
+    
+    module : string
+        the module code we are interested in. Needs to be in the module catalogue.
+        
+    Returns:
+    --------
+    
+    running_academic_years : frozenset of strings
+        academic years in which the module runs, e.g. '2024/2025'
+    """
+    module_catalogue_entry = module_catalogue_dictionary[module]
+    module_academic_year = module_catalogue_entry['Year']
+    module_is_alternating_entry = module_catalogue_entry['Alternate years']
+    if module_is_alternating_entry == 'Yes':
+        module_is_alternating = True
+    elif module_is_alternating_entry == 'No':
+        module_is_alternating = False
+    else:
+        raise(ValueError('cannot tell if module ' + module + ' is alternating or not. Check the table entry.'))
+    # figure out which years the module is running in
+    list_of_running_academic_years = [module_academic_year]
+    start_year = int(module_academic_year[:4])
+    for repeat_index in range(20):
+        if module_is_alternating:
+            new_academic_year = str(start_year + 2*repeat_index) + '/' + str(start_year + 2*repeat_index + 1)
+        else:
+            new_academic_year = str(start_year + repeat_index) + '/' + str(start_year + repeat_index + 1)
+        list_of_running_academic_years.append(new_academic_year)
+    if module == 'MT4614':
+        list_of_running_academic_years = ['2024/2025']
+    
+    return frozenset(list_of_running_academic_years)
 
 def find_not_running_modules(student):
     """Find all modules that the student is planning to take and which are not actually running in the year and semester
@@ -201,45 +280,26 @@ def find_not_running_modules(student):
     adviser_recommendations_list = []
     
     for module in student.planned_honours_modules:
-        if module.startswith('MT') and module not in module_catalogue['Module code'].values:
+        if module.startswith('MT') and module not in module_catalogue_codes:
             not_running_modules_list.append('Student is planning to take ' + module + ' (which does not exist)')
 
-    for _, row in student.honours_module_choices.iterrows():
+    for planned_module_code, planned_academic_year, planned_semester in zip(student.honours_module_choices['Module code'],
+                                                                           student.honours_module_choices['Academic year'],
+                                                                           student.honours_module_choices['Semester']):
         # get the module data
-        planned_module_code = row['Module code']
-        planned_academic_year = row['Academic year']
-        planned_semester = row['Semester']
-        if len(module_catalogue[module_catalogue['Module code'] == planned_module_code]) == 0:
+        module_catalogue_entry = module_catalogue_dictionary.get(planned_module_code)
+        if module_catalogue_entry is None:
             # the module does not exist, we have already flagged this so we are just going to
             # skip this here
             continue
-        module_catalogue_entry = module_catalogue[module_catalogue['Module code'] == planned_module_code]
-        module_semester = module_catalogue_entry['Semester'].values[0]
+        module_semester = module_catalogue_entry['Semester']
         # tell if the student picked the wrong semester
         if planned_semester != module_semester and module_semester != 'Full Year':
             not_running_modules_list.append('Selected module ' + planned_module_code + ' for Semester ' +
                                             planned_semester + ' but it is actually running in ' + module_semester)
         # figure out when the module is running
-        module_academic_year = module_catalogue_entry['Year'].values[0]
-        module_is_alternating_entry = module_catalogue_entry['Alternate years'].values[0]
-        if module_is_alternating_entry == 'Yes':
-            module_is_alternating = True
-        elif module_is_alternating_entry == 'No':
-            module_is_alternating = False
-        else:
-            raise(ValueError('cannot tell if module ' + planned_module_code + ' is alternating or not. Check the table entry.'))
-        # figure out which years the module is running in
-        list_of_running_academic_years = [module_academic_year]
-        start_year = int(module_academic_year[:4])
-        for repeat_index in range(20):
-            if module_is_alternating:
-                new_academic_year = str(start_year + 2*repeat_index) + '/' + str(start_year + 2*repeat_index + 1)
-            else:
-                new_academic_year = str(start_year + repeat_index) + '/' + str(start_year + repeat_index + 1)
-            list_of_running_academic_years.append(new_academic_year)
-        if planned_module_code == 'MT4614':
-            list_of_running_academic_years = ['2024/2025']
-        if planned_academic_year not in list_of_running_academic_years:
+        running_academic_years = get_running_academic_years(planned_module_code)
+        if planned_academic_year not in running_academic_years:
             not_running_modules_list.append('Selected module ' + planned_module_code + ' is not running in academic year ' +
                                             str(planned_academic_year))
 